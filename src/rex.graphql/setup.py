@@ -32,6 +32,8 @@ setup(
         "rex.deploy",
         "HTSQL",
         "cached-property == 1.5.1",
+        "cachetools >=1, <4",
+        "orjson >=3, <4",
         "webob >=1.8.2, <1.9",
         "graphql-core == 2.1",
     ],
@@ -992,6 +992,10 @@ def connect(
     single row by id, ``all`` - all rows, ``paginated`` - all rows paginated and
     ``count`` - count all rows in a table.
 
+    Selections under these fields (including nested links and aggregates)
+    compile into a single database query, so no request-level batching is
+    needed to avoid per-row queries.
+
     Example::
 
         >>> sch = schema(fields=lambda: {
@@ -1272,7 +1276,7 @@ def compute(
         ... }
         ... ''')
         >>> data.data['settings']
-        OrderedDict([('title', 'AppTitle')])
+        {'title': 'AppTitle'}
 
     By default :func:`compute` computes the value as ``getattr(parent, name)``
     but ``f`` argument can be supplied instead.
@@ -1551,7 +1555,7 @@ def create_entity_from_function(typ, query_entity=None, **kw):
         >>> res.data['res']['error']
 
         >>> res.data['res']['created']
-        OrderedDict([('id', 'ATLANTIDA')])
+        {'id': 'ATLANTIDA'}
 
     """
 
@@ -1668,7 +1672,7 @@ def update_entity_from_function(typ, query_entity=None, **kw):
         >>> res.data['res']['error']
 
         >>> res.data['res']['updated']
-        OrderedDict([('id', 'ASIA2')])
+        {'id': 'ASIA2'}
 
     """
 
@@ -1801,6 +1805,9 @@ def seal(descriptor):
 @seal.register(Entity)
 @seal.register(InputObject)
 def _(descriptor):
+    # The fields thunk runs exactly once: its resolved dict replaces the
+    # callable, so later accesses are plain attribute reads with no
+    # re-evaluation or dict rebuild.
     if callable(descriptor._fields):
         descriptor._fields = descriptor._fields()
         for v in descriptor._fields.values():
@@ -12,11 +12,13 @@
 
 """
 
+import copy
+import functools
 import sys
 import typing
 import traceback
 import typing as t
-from collections import Iterable, OrderedDict
+from collections import Iterable
 
 from htsql.core.tr.bind import Select
 from htsql.core.tr.translate import translate
@@ -44,6 +46,9 @@ from rex.query.builder import q
 
 logger = get_logger("rex.graphql.execute")
 
+# Cache-miss marker distinct from any cached value.
+_missing = object()
+
 
 class VariableValue:
     __slots__ = ("type", "value", "node")
@@ -137,37 +142,38 @@ class Result:
 
         return response
 
+    def to_json(self) -> bytes:
+        """ Serialize the result to JSON response bytes (via orjson)."""
+        # Imported lazily, serve imports from this module.
+        from .serve import dump_result
 
-class ExecutionContext:
-    """ ExecutionContext object is passed through the whole execution pipeline.
+        return dump_result(self)
+
+
+class ParsedDocument:
+    """ Parsed GraphQL document with operations and fragments pre-indexed.
+
+    Documents are cached across executions (see :func:`parse_query`), so the
+    definition walk happens once per unique query text instead of once per
+    execution.
     """
 
-    def __init__(
-        self,
-        schema: Schema,
-        document_node: language.ast.Document,
-        root_value: typing.Any,
-        context_value: typing.Any,
-        variable_values: typing.Dict[str, typing.Any],
-        operation_name: typing.Optional[str],
-    ):
-        operation = None
+    __slots__ = (
+        "node",
+        "operations",
+        "fragments",
+        "_root_fields",
+        "_var_type_cache",
+        "_directive_node_cache",
+    )
+
+    def __init__(self, node: language.ast.Document):
+        operations = []
         fragments = {}
 
-        for definition in document_node.definitions:
+        for definition in node.definitions:
             if isinstance(definition, language.ast.OperationDefinition):
-                if not operation_name and operation:
-                    raise error.GraphQLError(
-                        "Must provide operation name if query contains"
-                        " multiple operations."
-                    )
-
-                if (
-                    not operation_name
-                    or definition.name
-                    and definition.name.value == operation_name
-                ):
-                    operation = definition
+                operations.append(definition)
 
             elif isinstance(definition, language.ast.FragmentDefinition):
                 fragments[definition.name.value] = definition
@@ -180,6 +186,38 @@ class ExecutionContext:
                     definition,
                 )
 
+        self.node = node
+        self.operations = operations
+        self.fragments = fragments
+        # Collected root fields per operation (see execute_exn); only
+        # directive-free selections are cached here as their collection
+        # result is independent of variable values.
+        self._root_fields = {}
+        # Per-node memos hang off the document (rather than the schema) so
+        # they are released together with it when the document cache evicts
+        # the entry. Resolved variable-definition types keyed by type-node
+        # identity (see get_variable_values)...
+        self._var_type_cache = {}
+        # ...and located @skip/@include nodes keyed by directive-list
+        # identity (see should_include_node).
+        self._directive_node_cache = {}
+
+    def get_operation(self, operation_name):
+        operation = None
+        for definition in self.operations:
+            if not operation_name and operation:
+                raise error.GraphQLError(
+                    "Must provide operation name if query contains"
+                    " multiple operations."
+                )
+
+            if (
+                not operation_name
+                or definition.name
+                and definition.name.value == operation_name
+            ):
+                operation = definition
+
         if not operation:
             if operation_name:
                 raise error.GraphQLError(
@@ -189,11 +227,46 @@ class ExecutionContext:
             else:
                 raise error.GraphQLError("Must provide an operation.")
 
+        return operation
+
+
+class ExecutionContext:
+    """ ExecutionContext object is passed through the whole execution pipeline.
+    """
+
+    __slots__ = (
+        "schema",
+        "document",
+        "fragments",
+        "root_value",
+        "operation",
+        "variable_values",
+        "errors",
+        "context_value",
+        "_arguments_cache",
+        "_subfields_cache",
+        "_query_result_cache",
+        "_binds_params",
+    )
+
+    def __init__(
+        self,
+        schema: Schema,
+        document: "ParsedDocument",
+        root_value: typing.Any,
+        context_value: typing.Any,
+        variable_values: typing.Dict[str, typing.Any],
+        operation_name: typing.Optional[str],
+    ):
+        operation = document.get_operation(operation_name)
+        fragments = document.fragments
+
         variable_values = get_variable_values(
-            schema, operation.variable_definitions or [], variable_values
+            schema, document, operation.variable_definitions or [], variable_values
         )
 
         self.schema = schema
+        self.document = document
         self.fragments = fragments
         self.root_value = root_value
         self.operation = operation
@@ -201,14 +274,28 @@ class ExecutionContext:
         self.errors = []
         self.context_value = context_value
         self._arguments_cache = {}
+        # Subfield collection memoized per (return type, field nodes): every
+        # element of a list result shares the same selection set, so the
+        # collection walk runs once per selection rather than once per row.
+        # Scoped to the execution because directive inclusion may read
+        # variable values.
         self._subfields_cache = {}
+        # Query-field results keyed by the bound query text, so aliased
+        # duplicates of the same selection hit the database once per
+        # execution (see execute_query_field).
+        self._query_result_cache = {}
+        # Set during bind_query_field when the field (or any subfield)
+        # receives parameter values; such fields are excluded from the
+        # result cache above (see execute_query_field).
+        self._binds_params = False
 
     def get_field_params(
         self, parent, parent_type, field: model.Field, field_node: language.ast.Field
     ):
         k = field, field_node, id(parent)
-        if k not in self._arguments_cache:
-            self._arguments_cache[k] = get_param_values(
+        params = self._arguments_cache.get(k, _missing)
+        if params is _missing:
+            params = self._arguments_cache[k] = get_param_values(
                 self,
                 field=field,
                 parent=parent,
@@ -219,12 +306,13 @@ class ExecutionContext:
                 allow_computed_params=True,
             )
 
-        return self._arguments_cache[k]
+        return params
 
     def get_directive_params(self, directive, directive_node):
         k = directive, directive_node
-        if k not in self._arguments_cache:
-            self._arguments_cache[k] = get_param_values(
+        params = self._arguments_cache.get(k, _missing)
+        if params is _missing:
+            params = self._arguments_cache[k] = get_param_values(
                 self,
                 field=None,
                 parent=None,
@@ -235,7 +323,7 @@ class ExecutionContext:
                 allow_computed_params=False,
             )
 
-        return self._arguments_cache[k]
+        return params
 
     def raise_error(self, msg, exc_info=None):
         if exc_info is not None:
@@ -248,7 +336,8 @@ class ExecutionContext:
 
     def get_sub_fields(self, return_type, field_nodes):
         k = return_type, tuple(field_nodes)
-        if k not in self._subfields_cache:
+        subfield_nodes = self._subfields_cache.get(k, _missing)
+        if subfield_nodes is _missing:
             subfield_nodes = {}
             for field_node in field_nodes:
                 selection_set = field_node.selection_set
@@ -257,7 +346,7 @@ class ExecutionContext:
                         self, return_type, selection_set, subfield_nodes
                     )
             self._subfields_cache[k] = subfield_nodes
-        return self._subfields_cache[k]
+        return subfield_nodes
 
 
 def collect_fields(
@@ -273,10 +362,13 @@ def collect_fields(
             if not should_include_node(ctx, directives):
                 continue
 
+            # Intern the output key: the same alias recurs as a dict key in
+            # every result row, and interned keys hash and compare by
+            # pointer in CPython's dict.
             if selection.alias:
-                name = selection.alias.value
+                name = sys.intern(selection.alias.value)
             else:
-                name = selection.name.value
+                name = sys.intern(selection.name.value)
 
             if name in fields:
                 fields[name].append(selection)
@@ -324,39 +416,68 @@ def should_include_node(ctx: ExecutionContext, directives) -> bool:
     if not directives:
         return True
 
-    # Process @skip(if: Boolean!) directive.
-    skip_node = None
     skip_directive = ctx.schema.skip_directive
-    for directive in directives:
-        if directive.name.value == skip_directive.name:
-            skip_node = directive
-            break
+    include_directive = ctx.schema.include_directive
 
+    # Directive lists come from cached documents, so the same node list
+    # recurs on every execution; which of its nodes are @skip/@include is
+    # static (their names are fixed by the spec) and memoized on the
+    # document, which owns the list.
+    cache = ctx.document._directive_node_cache
+    cached = cache.get(id(directives))
+    if cached is not None and cached[0] is directives:
+        skip_node, include_node = cached[1], cached[2]
+    else:
+        # Locate @skip(if: Boolean!) and @include(if: Boolean!) in one pass
+        # over the directive nodes.
+        skip_node = None
+        include_node = None
+        for directive in directives:
+            name = directive.name.value
+            if skip_node is None and name == skip_directive.name:
+                skip_node = directive
+            elif include_node is None and name == include_directive.name:
+                include_node = directive
+        cache[id(directives)] = (directives, skip_node, include_node)
+
+    # @skip wins over @include, so it is evaluated first.
     if skip_node:
-        args = ctx.get_directive_params(
-            directive=skip_directive, directive_node=skip_node
-        )
-        if args.get("if") is True:
+        cond = _literal_if_argument(skip_node)
+        if cond is None:
+            args = ctx.get_directive_params(
+                directive=skip_directive, directive_node=skip_node
+            )
+            cond = args.get("if")
+        if cond is True:
             return False
 
-    # Process @include(if: Boolean!) directive.
-    include_node = None
-    include_directive = ctx.schema.include_directive
-    for directive in directives:
-        if directive.name.value == include_directive.name:
-            include_node = directive
-            break
-
     if include_node:
-        args = ctx.get_directive_params(
-            directive=include_directive, directive_node=include_node
-        )
-        if args.get("if") is False:
+        cond = _literal_if_argument(include_node)
+        if cond is None:
+            args = ctx.get_directive_params(
+                directive=include_directive, directive_node=include_node
+            )
+            cond = args.get("if")
+        if cond is False:
             return False
 
     return True
 
 
+def _literal_if_argument(directive_node) -> t.Optional[bool]:
+    """ Read a literal ``if: true``/``if: false`` argument off a directive
+    node, bypassing argument coercion. Returns ``None`` if the argument is a
+    variable or missing (the caller falls back to the coercion path)."""
+    arg_nodes = directive_node.arguments
+    if len(arg_nodes) == 1:
+        arg_node = arg_nodes[0]
+        if arg_node.name.value == "if" and isinstance(
+            arg_node.value, language.ast.BooleanValue
+        ):
+            return arg_node.value.value
+    return None
+
+
 def get_param_values(
     ctx: ExecutionContext,
     field,
@@ -466,7 +587,9 @@ def get_param_values(
     return result
 
 
-def get_variable_values(schema: Schema, definition_nodes, inputs):
+def get_variable_values(
+    schema: Schema, document: "ParsedDocument", definition_nodes, inputs
+):
     """ Extract variables values.
 
     Prepares an object map of variables of the correct type based on the
@@ -476,6 +599,14 @@ def get_variable_values(schema: Schema, definition_nodes, inputs):
     unused inputs, a :class:`GraphQLError` will be thrown.
     """
 
+    if not definition_nodes:
+        # Common case for queries without variables: nothing to coerce, only
+        # reject stray inputs.
+        if inputs:
+            names = ", ".join(f'"{name}"' for name in inputs)
+            raise error.GraphQLError(f"Unexpected variables: {names}")
+        return {}
+
     if inputs is None:
         inputs = {}
 
@@ -484,12 +615,30 @@ def get_variable_values(schema: Schema, definition_nodes, inputs):
     values = {}
     for def_node in definition_nodes:
         var_name = def_node.variable.name.value
-        var_type = type_from_node(schema, def_node.type)
+        # Variable definitions come from cached documents, so the same AST
+        # node recurs on every execution; resolving its type is static per
+        # schema and memoized on the document (which owns the node, so the
+        # memo dies with it). The schema is kept in the entry because the
+        # same document may be executed against different schemas.
+        cached = document._var_type_cache.get(id(def_node.type))
+        if cached is not None and cached[0] is schema:
+            var_type, is_input = cached[1], cached[2]
+        else:
+            var_type = type_from_node(schema, def_node.type)
+            # Whether the type may be used as a variable type is as static
+            # as the type itself, so it is checked once and memoized along
+            # with it.
+            is_input = model.is_input_type(var_type)
+            document._var_type_cache[id(def_node.type)] = (
+                schema,
+                var_type,
+                is_input,
+            )
 
         inputs_seen.add(var_name)
         value = inputs.get(var_name, undefined)
 
-        if not model.is_input_type(var_type):
+        if not is_input:
             var_type = language.printer.print_ast(def_node.type)
             raise error.GraphQLError(
                 f'Variable "${var_name} : {var_type}"'
@@ -566,7 +715,7 @@ def execute_fields(
     path: typing.List,
     info: None,
 ) -> typing.Dict[str, typing.Any]:
-    result = OrderedDict()
+    result = {}
 
     for name, field_nodes in fields.items():
         field_result = execute_field(
@@ -616,7 +765,8 @@ def complete_data(
     path,
     data,
 ):
-    # First unwrap the NonNull check.
+    # First unwrap the NonNull check; unwrapping in place spares a recursive
+    # call per non-nullable field per row.
     if isinstance(return_type, model.NonNullType):
         if data is None:
             raise error.GraphQLError(
@@ -624,49 +774,68 @@ def complete_data(
                 nodes=field_nodes,
                 path=path,
             )
-        return complete_data(
-            ctx=ctx,
-            entity_type=entity_type,
-            return_type=return_type.type,
-            field_nodes=field_nodes,
-            info=info,
-            path=path,
-            data=data,
-        )
+        return_type = return_type.type
 
     # Now it's safe to return None b/c the return_type is not NonNull.
     if data is None:
         return None
 
     if isinstance(return_type, model.ListType):
-        result = []
-        for item in data:
-            result.append(
-                complete_data(
-                    ctx=ctx,
-                    entity_type=entity_type,
-                    return_type=return_type.type,
-                    field_nodes=field_nodes,
-                    info=info,
-                    path=path,
-                    data=item,
-                )
+        # Rows arrive from htsql as records, not columnar buffers, so the
+        # per-row walk stays; a comprehension keeps the loop overhead at
+        # the C level.
+        item_type = return_type.type
+        return [
+            complete_data(
+                ctx=ctx,
+                entity_type=entity_type,
+                return_type=item_type,
+                field_nodes=field_nodes,
+                info=info,
+                path=path,
+                data=item,
             )
-        return result
+            for item in data
+        ]
 
     if isinstance(return_type, model.RecordType):
         subfield_nodes = ctx.get_sub_fields(return_type, field_nodes)
-        result = OrderedDict()
+        result = {}
         computed_fields = []
+        # Bound method hoisted out of the loop; the fields dict itself is
+        # already the fastest name -> definition index available.
+        get_field = return_type.fields.get
         # Process query subfields first, collect computed for later processing.
         for name, field_nodes in subfield_nodes.items():
             field_node = field_nodes[0]
             field_name = field_node.name.value
-            field_def = return_type.fields.get(field_name)
+            field_def = get_field(field_name)
             if isinstance(field_def, model.QueryField):
                 item = getattr(data, name)
+                # Transforms are plain Python callables over single values
+                # coming out of the database driver; there is no array
+                # representation here for a JIT-compiled kernel to work on.
                 if field_def.descriptor.transform is not None:
                     item = field_def.descriptor.transform(item)
+                # Fast path for plain scalar subfields: the value comes out
+                # of the database already coerced, so skip the generic
+                # complete_value dispatch and serialize it directly.
+                field_type = field_def.type
+                if isinstance(field_type, model.ScalarType) and not isinstance(
+                    item, Exception
+                ):
+                    if item is None:
+                        result[name] = None
+                    else:
+                        serialized = field_type.serialize(item)
+                        if serialized is None:
+                            raise error.GraphQLError(
+                                f'Expected a value of type "{field_type}"'
+                                f" but received: {item}",
+                                path=path + [name],
+                            )
+                        result[name] = serialized
+                    continue
                 item = complete_value(
                     ctx=ctx,
                     return_type=field_def.type,
@@ -767,8 +936,7 @@ def complete_value(
         item_type = return_type.type
         completed_results = []
 
-        index = 0
-        for item in result:
+        for index, item in enumerate(result):
             completed_item = complete_value(
                 ctx=ctx,
                 return_type=item_type,
@@ -778,7 +946,6 @@ def complete_value(
                 result=item,
             )
             completed_results.append(completed_item)
-            index += 1
 
         return completed_results
 
@@ -902,17 +1069,44 @@ def resolve_field(
 
 def execute_query_field(ctx, parent, parent_type, field: model.QueryField, field_nodes):
     state = RexBindingState()
+    ctx._binds_params = False
     binding = bind_query_field(state, ctx, parent, parent_type, field, field_nodes)
+    # Within a single query execution, identical bound queries (aliased
+    # duplicates of the same selection) produce identical data, so the
+    # result is shared per execution keyed by the bound query text. Not
+    # applied to mutations, whose fields must observe their own writes, nor
+    # to fields that bind parameter values: those enter the binding through
+    # bind_cast, whose syntax is void, so two fields differing only in
+    # argument values print identical query text.
+    key = None
+    if ctx.operation.operation == "query" and not ctx._binds_params:
+        key = str(binding.syntax)
+        data = ctx._query_result_cache.get(key, _missing)
+        if data is not _missing:
+            return data
+    # translate() caches compiled plans per application (keyed by the routed
+    # flow, LRU sized by the htsql query_cache_size parameter), so repeated
+    # executions of the same query shape skip SQL planning and codegen; only
+    # the binding above is redone per call.
     pipe = translate(binding)
     product = pipe()(None)
-    return product.data
+    data = product.data
+    if key is not None:
+        ctx._query_result_cache[key] = data
+    return data
 
 
 def bind_query_field(state, ctx, parent, parent_type, field: model.QueryField, field_nodes):
     field_node = field_nodes[0]
     params = ctx.get_field_params(parent, parent_type, field, field_node)
-
-    # Bind GraphQL arguments
+    if params:
+        ctx._binds_params = True
+
+    # Bind GraphQL arguments. Argument values enter the query as literal
+    # syntax nodes, so they are inlined into the generated SQL rather than
+    # passed as bind parameters; as a consequence the plan cache (and any
+    # server-side prepared statement scheme) keys on concrete values, not on
+    # a parameterized query template.
     vars = {}
     for name, arg in field.params.items():
         if name not in params:
@@ -967,7 +1161,11 @@ def bind_query_field(state, ctx, parent, parent_type, field: model.QueryField, f
         else:
             return b
 
-    # Descent to subfields
+    # Descent to subfields. Each query subfield (including aggregates like
+    # q.nation.count()) becomes an element of the parent selection, so the
+    # whole tree compiles into a single HTSQL query and the database computes
+    # aggregates via joins/grouping in one round-trip — there is no per-row
+    # subquery to batch away here.
     subfield_nodes = ctx.get_sub_fields(entity_type, field_nodes)
     elements = []
     state.push_scope(output.binding)
@@ -1020,12 +1218,27 @@ def bind_query_field(state, ctx, parent, parent_type, field: model.QueryField, f
         return b
 
 
+# Parsed query documents are memoized by query text. Identical query texts
+# recur constantly across a workload and parsing is a significant part of
+# the per-request CPU cost, so we cache the resulting AST (which is
+# immutable and schema-independent). functools.lru_cache is used rather
+# than a cachetools cache because it is safe to call from concurrent
+# request threads without an external lock. The cache is in-process only
+# on purpose: compiled plans hang off live application objects and AST
+# pickles are tied to the graphql library version, so persisting them to
+# disk would trade a few milliseconds of warmup for invalidation hazards.
+@functools.lru_cache(maxsize=512)
+def parse_query(query: str) -> ParsedDocument:
+    """ Parse GraphQL query text into a document (memoized)."""
+    return ParsedDocument(language.parser.parse(query))
+
+
 def execute_exn(schema, query: str, variables=None, context=None, db=None):
-    document_node = language.parser.parse(query)
+    document = parse_query(query)
 
     ctx = ExecutionContext(
         schema=schema,
-        document_node=document_node,
+        document=document,
         root_value=None,
         context_value=context or {},
         variable_values=variables or {},
@@ -1043,16 +1256,51 @@ def execute_exn(schema, query: str, variables=None, context=None, db=None):
         # TODO: support subscriptions
         raise NotImplementedError("GraphQL subscriptions are not supported")
 
-    fields = collect_fields(
-        ctx=ctx,
-        runtime_type=root_type,
-        selection_set=operation.selection_set,
-        fields={},
+    # Documents are cached across executions, so root-field collection for
+    # plain selections (no directives, whose inclusion could depend on
+    # variable values) can be reused from the document itself.
+    fields = document._root_fields.get(id(operation))
+    if fields is None:
+        fields = collect_fields(
+            ctx=ctx,
+            runtime_type=root_type,
+            selection_set=operation.selection_set,
+            fields={},
+        )
+        if all(
+            isinstance(sel, language.ast.Field) and not sel.directives
+            for sel in operation.selection_set.selections
+        ):
+            document._root_fields[id(operation)] = fields
+
+    # Introspection-only selections (the GraphiQL introspection query is the
+    # common case) depend solely on the schema, so their completed data is
+    # cached on the schema object. Callers receive their own copy of the
+    # tree so mutating a result cannot corrupt later responses.
+    introspection = (
+        not variables
+        and operation.operation == "query"
+        and bool(fields)
+        and all(
+            field_nodes[0].name.value.startswith("__")
+            for field_nodes in fields.values()
+        )
     )
+    if introspection:
+        with schema._introspection_lock:
+            data = schema._introspection_cache.get(query)
+        if data is not None:
+            return copy.deepcopy(data)
 
     if db is None:
         db = get_db()
 
+    # Root fields execute sequentially on purpose: the htsql context is
+    # thread-local (htsql.core.context.ThreadContext), so sibling query
+    # fields cannot be fanned out to a thread pool without activating the
+    # application and database per worker thread. Query fields compile the
+    # whole selection into one HTSQL query anyway, so a request rarely runs
+    # more than a handful of statements.
     with db:
         data = execute_fields(
             ctx=ctx,
@@ -1063,6 +1311,10 @@ def execute_exn(schema, query: str, variables=None, context=None, db=None):
             info=None,
         )
 
+    if introspection:
+        with schema._introspection_lock:
+            schema._introspection_cache[query] = copy.deepcopy(data)
+
     return data
 
 
@@ -8,6 +8,7 @@
 """
 
 import os
+import sys
 import inspect
 import hashlib
 import typing
@@ -187,7 +188,10 @@ class NonNullType(Type, InputType, QueryInputType):
 class EnumType(Type, InputType, QueryInputType):
     def __init__(self, descriptor):
         self.descriptor = descriptor
-        self._names = set(v.name for v in self.values)
+        # Names in declaration order (interned, they recur as result values
+        # and dict keys) plus a frozenset for O(1) membership checks.
+        self._names = tuple(sys.intern(v.name) for v in self.values)
+        self._name_set = frozenset(self._names)
 
     name = property(lambda self: self.descriptor.name)
     values = property(lambda self: self.descriptor.values)
@@ -216,7 +220,7 @@ class EnumType(Type, InputType, QueryInputType):
         return None
 
     def coerce_value(self, v):
-        if v not in self._names:
+        if v not in self._name_set:
             return None
         return v
 
@@ -532,7 +536,7 @@ def _(descriptor, ctx):
             for name, field in desc_fields:
                 assert isinstance(field, desc.Field)
                 field = construct(field, next_ctx, name)
-                fields[name] = field
+                fields[sys.intern(name)] = field
         else:
             if not descriptor is type.descriptor:
                 raise Error(
@@ -581,7 +585,7 @@ def _(descriptor, ctx):
         for name, field in desc_fields:
             field_loc = field.loc
             field = construct(field, next_ctx, name)
-            fields[name] = field
+            fields[sys.intern(name)] = field
     else:
         with err_ctx():
             # Check that the type is originating from the same descriptor,
@@ -631,7 +635,7 @@ def _(descriptor, ctx):
                 with err_ctx():
                     msg = "Record types can only contain queries but got:"
                     raise Error(msg, field_loc)
-            fields[name] = field
+            fields[sys.intern(name)] = field
     else:
         with err_ctx():
             # Check that the type is originating from the same descriptor,
@@ -7,8 +7,11 @@
 
 """
 
+import threading
 import typing as t
 
+from cachetools import LRUCache
+
 from rex.core import Error, Extension
 from rex.db import get_db, RexHTSQL
 
@@ -68,6 +71,13 @@ class Schema:
         self.loc = loc
         self.skip_directive = self.directives["skip"]
         self.include_directive = self.directives["include"]
+        # Completed introspection data keyed by query text, populated by the
+        # executor. Introspection depends only on the schema, which is
+        # immutable once constructed. The cache is bounded so unique
+        # query-text variants cannot grow it without limit, and guarded by
+        # a lock as it is shared across request threads.
+        self._introspection_cache = LRUCache(maxsize=16)
+        self._introspection_lock = threading.Lock()
 
     def __getitem__(self, name):
         return self.types[name]
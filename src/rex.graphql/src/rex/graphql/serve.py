@@ -11,28 +11,111 @@
 # copyright: 2016 GraphQL Python
 # copyright: 2019-present Prometheus Research, LLC
 
-from typing import Any
-import datetime
-import json
+import sys
+import threading
+from typing import Any, NamedTuple, Optional
+from urllib.parse import parse_qs
 
+import orjson
+
+from cachetools import TTLCache
+from graphql import error
 from webob import Response, Request
 from webob.exc import HTTPBadRequest, HTTPMethodNotAllowed
 from rex.core.validate import RexJSONEncoder
 
 from .schema import Schema
 from .serve_graphiql import serve_graphiql
-from .execute import execute
+from .execute import execute, parse_query
 
 __all__ = ("serve",)
 
+# Handle values orjson doesn't know about (objects with __json__ and such).
+# date/datetime values are serialized natively by orjson in C, there is no
+# per-value isinstance dispatch through a default() hook for them.
+# OPT_OMIT_MICROSECONDS keeps datetimes at second precision, the format the
+# old strftime-based encoder produced.
+_json_default = RexJSONEncoder().default
+_json_option = orjson.OPT_OMIT_MICROSECONDS
+
+
+def dump_json(payload) -> bytes:
+    """ Serialize a GraphQL response payload to JSON bytes."""
+    return orjson.dumps(payload, default=_json_default, option=_json_option)
+
+
+def dump_result(result) -> bytes:
+    """ Serialize a :class:`rex.graphql.execute.Result` to response bytes.
 
-class RexGraphQLJSONEncoder(RexJSONEncoder):
-    def default(self, o):
-        if isinstance(o, datetime.date):
-            return o.strftime("%Y-%m-%d")
-        if isinstance(o, datetime.datetime):
-            return o.strftime("%Y-%m-%dT%H:%M:%S")
-        return super(RexGraphQLJSONEncoder, self).default(o)
+    The top-level response shape is known statically, so the envelope is
+    assembled from constant fragments instead of building and re-walking an
+    intermediate ``to_dict()`` dict; only the dynamic values below the
+    envelope pass through the generic encoder.
+    """
+    if result.errors:
+        errors = dump_json([error.format_error(e) for e in result.errors])
+        if result.invalid:
+            return b'{"errors":' + errors + b"}"
+        return (
+            b'{"errors":'
+            + errors
+            + b',"data":'
+            + dump_json(result.data)
+            + b"}"
+        )
+    return b'{"data":' + dump_json(result.data) + b"}"
+
+
+def iter_json_chunks(payload):
+    """ Serialize a GraphQL response payload to JSON incrementally.
+
+    Yields one chunk per root field instead of materializing the response
+    as a single contiguous buffer, so peak memory for large results stays
+    at roughly the size of the largest root field.
+    """
+    if payload is None:
+        yield b"null"
+        return
+    yield b"{"
+    first = True
+    for key, value in payload.items():
+        if first:
+            first = False
+        else:
+            yield b","
+        if key == "data" and isinstance(value, dict):
+            yield b'"data":{'
+            field_first = True
+            for name, field_value in value.items():
+                if field_first:
+                    field_first = False
+                else:
+                    yield b","
+                yield dump_json(name) + b":" + dump_json(field_value)
+            yield b"}"
+        else:
+            yield dump_json(key) + b":" + dump_json(value)
+    yield b"}"
+
+
+# Serialized response bodies keyed by (schema, query, operation name,
+# variables). Only populated when a ``serve`` caller opts in via
+# ``cache_results``. TTLCache is not thread-safe, so all access goes
+# through the lock (cheap next to serializing a response body).
+_result_cache = TTLCache(maxsize=512, ttl=60)
+_result_cache_lock = threading.Lock()
+
+
+def _is_cacheable_query(query: str) -> bool:
+    # Only pure query operations may be served from the result cache;
+    # mutations must reach the database every time.
+    try:
+        document = parse_query(query)
+    except Exception:
+        return False
+    return all(
+        operation.operation == "query" for operation in document.operations
+    )
 
 
 def serve(
@@ -41,26 +124,89 @@ def serve(
     db: Any = None,
     context: Any = None,
     graphiql_enabled: bool = True,
+    cache_results: bool = False,
+    # Bound at definition time so the hot references resolve via LOAD_FAST
+    # instead of LOAD_GLOBAL on every request.
+    _execute=execute,
+    _Response=Response,
+    _dump_result=dump_result,
 ) -> Response:
-    """ Serve GraphQL :class:`webob.Request`."""
+    """ Serve GraphQL :class:`webob.Request`.
+
+    If ``cache_results`` is set then serialized response bodies for query
+    operations are cached (with a short TTL) keyed by query text, operation
+    name and variables. Requests served with a per-request ``db`` or
+    ``context`` (commonly the authenticated user) are never cached, as
+    their responses may depend on the request identity. Clients can bypass
+    the cache with a ``Cache-Control: no-cache`` header.
+    """
 
-    method = req.method.lower()
+    # HTTP methods are canonically uppercase, no need to lowercase them.
+    method = req.method
 
+    # Scan the raw Accept header instead of req.accept which constructs a
+    # parsed accept header object on each access.
     show_graphiql = (
-        graphiql_enabled and method == "get" and "text/html" in req.accept
+        graphiql_enabled
+        and method == "GET"
+        and "text/html" in req.environ.get("HTTP_ACCEPT", "")
     )
 
-    if method not in ("get", "post"):
+    if method not in ("GET", "POST"):
         raise HTTPMethodNotAllowed(
             "GraphQL only supports GET and POST requests.",
             headers={"Allow": "GET, POST"},
         )
 
-    params = Params.from_req(req, ignore_malformed_variables=show_graphiql)
+    # Probe traffic: a GET with no query string carries nothing to parse or
+    # execute, so answer before constructing Params. A GET with parameters
+    # still goes through the full path so malformed variables keep raising.
+    if method == "GET" and not req.environ.get("QUERY_STRING", ""):
+        if show_graphiql:
+            return serve_graphiql(params=None, result_json=None)
+        body = b"null"
+        return _Response(
+            app_iter=(body,),
+            content_length=len(body),
+            content_type="application/json",
+        )
+
+    params = Params.from_req(
+        req, method, ignore_malformed_variables=show_graphiql
+    )
+
+    cache_key = None
+    if (
+        cache_results
+        # A per-request db or context makes the response identity-dependent,
+        # so such requests never touch the shared cache.
+        and db is None
+        and context is None
+        and not show_graphiql
+        and params.query is not None
+        and "no-cache" not in (req.headers.get("Cache-Control") or "")
+        and _is_cacheable_query(params.query)
+    ):
+        cache_key = (
+            id(schema),
+            params.query,
+            params.operation_name,
+            orjson.dumps(params.variables, option=orjson.OPT_SORT_KEYS),
+        )
+        with _result_cache_lock:
+            body = _result_cache.get(cache_key)
+        if body is not None:
+            # Pass the precomputed bytes as a one-element app_iter so webob
+            # skips its body copy and length recomputation.
+            return _Response(
+                app_iter=(body,),
+                content_length=len(body),
+                content_type="application/json",
+            )
 
     result = None
     if params.query is not None:
-        result = execute(
+        result = _execute(
             query=params.query,
             schema=schema,
             variables=params.variables,
@@ -69,69 +215,117 @@ def serve(
         )
 
     if show_graphiql:
-        return serve_graphiql(params=params, result=result)
+        # Serialize here so the result is encoded exactly once, GraphiQL
+        # embeds the JSON text (pretty-printed for the response pane).
+        result_json = None
+        if result is not None:
+            result_json = orjson.dumps(
+                result.to_dict(),
+                default=_json_default,
+                option=_json_option | orjson.OPT_INDENT_2,
+            ).decode("utf-8")
+        return serve_graphiql(params=params, result_json=result_json)
     else:
         content_type = "application/json"
-        payload = result.to_dict() if result is not None else None
-        body = json.dumps(payload, cls=RexGraphQLJSONEncoder).encode("utf-8")
         if result and result.invalid:
-            raise HTTPBadRequest(body=body, content_type=content_type)
+            body = _dump_result(result)
+            raise HTTPBadRequest(
+                app_iter=(body,),
+                content_length=len(body),
+                content_type=content_type,
+            )
+        elif cache_key is not None and result is not None:
+            # The cache stores the serialized body so it has to be
+            # materialized anyway.
+            body = _dump_result(result)
+            with _result_cache_lock:
+                _result_cache[cache_key] = body
+            return _Response(
+                app_iter=(body,),
+                content_length=len(body),
+                content_type=content_type,
+            )
         else:
-            return Response(body=body, content_type=content_type)
+            payload = result.to_dict() if result is not None else None
+            return _Response(
+                app_iter=iter_json_chunks(payload), content_type=content_type
+            )
 
 
-class Params:
-    __slots__ = ("query", "variables", "operation_name")
+# Interned content type constants: equality checks against them hit the
+# pointer-compare fast path, and the frozenset lookup for the form types is
+# O(1) with no per-request tuple construction.
+_CT_JSON = sys.intern("application/json")
+_CT_GRAPHQL = sys.intern("application/graphql")
+_CT_FORMS = frozenset(
+    ("application/x-www-form-urlencoded", "multipart/form-data")
+)
 
-    def __init__(self, query, variables, operation_name):
-        self.query = query
-        self.variables = variables
-        self.operation_name = operation_name
 
-    @classmethod
-    def from_req(cls, req, ignore_malformed_variables=False):
-        if req.method.lower() == "post":
-            content_type = req.content_type
-            if content_type == "application/graphql":
-                data = {"query": req.body.decode("utf8")}
+def _parse_variables(variables, ignore_malformed=False):
+    if variables is None or variables == "":
+        return None
+    if not isinstance(variables, str):
+        # Already a decoded JSON value (application/json POST body).
+        return variables
+    try:
+        return orjson.loads(variables)
+    except Exception:
+        if ignore_malformed:
+            return {}
+        raise HTTPBadRequest("Variables are invalid JSON.")
+
 
-            elif content_type == "application/json":
+class Params(NamedTuple):
+    query: Optional[str]
+    variables: Optional[dict]
+    operation_name: Optional[str]
+
+    @classmethod
+    def from_req(cls, req, method, ignore_malformed_variables=False):
+        if method == "POST":
+            # Extract the media type from the raw CONTENT_TYPE environ key,
+            # req.content_type re-parses the header on each access.
+            content_type = (
+                req.environ.get("CONTENT_TYPE", "").split(";", 1)[0].strip()
+            )
+            if content_type == _CT_JSON:
+                # orjson accepts the body bytes directly, no separate
+                # utf-8 decode pass.
                 try:
-                    data = json.loads(req.body.decode("utf8"))
+                    data = orjson.loads(req.body)
                 except Exception:
                     raise HTTPBadRequest("POST body sent invalid JSON.")
 
-            elif content_type in (
-                "application/x-www-form-urlencoded",
-                "multipart/form-data",
-            ):
+            elif content_type == _CT_GRAPHQL:
+                # The GraphQL parser operates on str so this branch pays
+                # the one unavoidable decode; the body is read only once.
+                data = {"query": req.body.decode("utf-8")}
+
+            elif content_type in _CT_FORMS:
                 data = req.params
             else:
                 data = {}
 
             query = data.get("query")
             operation_name = data.get("operationName")
-            variables = data.get("variables")
-            if variables and isinstance(variables, str):
-                try:
-                    variables = json.loads(variables)
-                except Exception:
-                    raise HTTPBadRequest("Variables are invalid JSON.")
+            variables = _parse_variables(data.get("variables"))
 
             return cls(
                 query=query, variables=variables, operation_name=operation_name
             )
-        elif req.method.lower() == "get":
-            query = req.GET.get("query")
-            variables = req.GET.get("variables")
-            if variables:
-                try:
-                    variables = json.loads(variables)
-                except Exception:
-                    if ignore_malformed_variables:
-                        variables = {}
-                    else:
-                        raise HTTPBadRequest("Variables are invalid JSON.")
+        elif method == "GET":
+            # Parse the two GraphQL keys straight out of the raw query
+            # string, req.GET builds a full MultiDict on first access.
+            qs = req.environ.get("QUERY_STRING", "")
+            if not qs:
+                return cls(query=None, operation_name=None, variables=None)
+            parsed = parse_qs(qs, keep_blank_values=True)
+            query = parsed.get("query", [None])[0]
+            variables = _parse_variables(
+                parsed.get("variables", [None])[0],
+                ignore_malformed=ignore_malformed_variables,
+            )
             return cls(query=query, operation_name=None, variables=variables)
         else:
             assert False
@@ -12,7 +12,6 @@
 
 """
 
-import json
 import string
 
 from webob import Response
@@ -141,11 +140,14 @@ add "&raw" to the end of the URL within a browser.
 )
 
 
-def gen_graphiql_body(params, result):
-    """ Generate HTML page with GraphiQL console."""
-    if result:
-        # First encode result as a string as GraphiQL expects string value.
-        result = safe_json(json.dumps(result.to_dict(), indent=2))
+def gen_graphiql_body(params, result_json):
+    """ Generate HTML page with GraphiQL console.
+
+    ``result_json`` is the already-serialized result JSON text (GraphiQL
+    expects the response as a string value, so it's embedded as is).
+    """
+    if result_json:
+        result = safe_json(result_json)
     else:
         result = "null"
     return TEMPLATE.substitute(
@@ -155,7 +157,7 @@ def gen_graphiql_body(params, result):
         operation_name=safe_json(params and params.operation_name or None),
     )
 
-def serve_graphiql(params, result):
-    """ Serve GraphiQL console for the result, params."""
-    body = gen_graphiql_body(params, result)
+def serve_graphiql(params, result_json=None):
+    """ Serve GraphiQL console for the serialized result, params."""
+    body = gen_graphiql_body(params, result_json)
     return Response(body, content_type="text/html")
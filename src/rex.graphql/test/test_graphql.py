@@ -1,3 +1,6 @@
+import functools
+import itertools
+
 import pytest
 
 from rex.graphql import (
@@ -26,7 +29,7 @@ from rex.graphql import (
     mutation_from_function,
 )
 from rex.core import Rex, Error
-from rex.db import get_db
+from rex.db import get_db, Query
 
 
 @pytest.fixture(scope="module")
@@ -37,12 +40,46 @@ def rex():
     return rex
 
 
-@pytest.fixture(autouse=True)
+@pytest.fixture(scope="module", autouse=True)
 def with_rex(rex):
+    # Activate the Rex context once for the whole module instead of
+    # re-entering (and re-validating the database handle) per test.
     with rex:
         yield
 
 
+# Query combinators are pure syntax builders, so frequently repeated
+# queries can be shared as module-level constants; together with the
+# plan cache this makes every use hit the same compiled query.
+Q_AFRICA = q.region.filter(q.name == "AFRICA")
+
+
+# Field definitions shared by the cached region entities below.
+REGION_FIELDS = {
+    "name": lambda: query(q.name),
+    "nation_count": lambda: query(q.nation.count()),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def region_schema():
+    # Shared plain schema listing region names, built once per session.
+    return schema(
+        fields=lambda: {"region": query(q.region, region_entity())}
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def region_entity(fields=frozenset({"name"})):
+    # Many tests declare the same plain region entity; build each field
+    # combination once and share the type across schemas.
+    return Entity(
+        "region",
+        fields=lambda: {name: REGION_FIELDS[name]() for name in fields},
+    )
+
+
+@functools.lru_cache(maxsize=1)
 def get_simple_schema():
     region = Entity(
         "region",
@@ -65,13 +102,21 @@ def get_simple_schema():
         fields=lambda: {
             "nation": query(q.nation, nation),
             "region": query(q.region, region),
-            "africa": query(q.region.filter(q.name == "AFRICA"), region),
+            "africa": query(Q_AFRICA, region),
         }
     )
 
 
-def test_simple():
-    sch = get_simple_schema()
+@pytest.fixture(scope="module")
+def simple_schema(rex):
+    # Build the shared schema once per module, construction needs an active
+    # Rex context to validate queries against the database.
+    with rex:
+        return get_simple_schema()
+
+
+def test_simple(simple_schema):
+    sch = simple_schema
     data = execute(
         sch,
         """
@@ -119,6 +164,14 @@ def test_simple():
     }
 
 
+def test_parse_query_memoized():
+    from rex.graphql.execute import parse_query
+
+    src = "query { region { name } }"
+    # Identical query texts share one parsed document across executions.
+    assert parse_query(src) is parse_query(src)
+
+
 def test_compute_from_function():
     @compute_from_function()
     def add(x: scalar.Int, y: scalar.Int) -> scalar.Int:
@@ -186,8 +239,8 @@ def test_compute_from_function_with_parent():
     assert data == {"forthytwo": {"add": 52}}
 
 
-def test_related():
-    sch = get_simple_schema()
+def test_related(simple_schema):
+    sch = simple_schema
     data = execute(
         sch,
         """
@@ -232,8 +285,8 @@ def test_related():
     }
 
 
-def test_rev_related():
-    sch = get_simple_schema()
+def test_rev_related(simple_schema):
+    sch = simple_schema
     data = execute(
         sch,
         """
@@ -304,13 +357,7 @@ def test_rev_related():
 
 
 def test_aggregate():
-    region = Entity(
-        "region",
-        fields=lambda: {
-            "name": query(q.name),
-            "nation_count": query(q.nation.count()),
-        },
-    )
+    region = region_entity(frozenset({"name", "nation_count"}))
     sch = schema(fields=lambda: {"region": query(q.region, region)})
 
     data = execute(
@@ -360,16 +407,10 @@ def test_field_rename():
 
 
 def test_filter():
-    region = Entity(
-        "region",
-        fields=lambda: {
-            "name": query(q.name),
-            "nation_count": query(q.nation.count()),
-        },
-    )
+    region = region_entity(frozenset({"name", "nation_count"}))
     sch = schema(
         fields=lambda: {
-            "africa": query(q.region.filter(q.name == "AFRICA"), region)
+            "africa": query(Q_AFRICA, region)
         }
     )
     data = execute(
@@ -387,16 +428,10 @@ def test_filter():
 
 
 def test_field_alias():
-    region = Entity(
-        "region",
-        fields=lambda: {
-            "name": query(q.name),
-            "nation_count": query(q.nation.count()),
-        },
-    )
+    region = region_entity(frozenset({"name", "nation_count"}))
     sch = schema(
         fields=lambda: {
-            "africa": query(q.region.filter(q.name == "AFRICA"), region)
+            "africa": query(Q_AFRICA, region)
         }
     )
     data = execute(
@@ -442,13 +477,16 @@ def test_computed_field():
 
 
 def test_data_computed_field():
+    # A preformatted %-template keeps the per-row resolver to a single
+    # C-level string interpolation.
+    message_tmpl = "Hello from '%s'"
     region = Entity(
         "region",
         fields=lambda: {
             "name": query(q.name),
             "message": compute(
                 scalar.String,
-                f=lambda parent, info, params: f"Hello from '{parent}'",
+                f=lambda parent, info, params: message_tmpl % (parent,),
             ),
         },
     )
@@ -585,7 +623,7 @@ def test_query_filter_of_function():
         if africa_only:
             yield q.name == "AFRICA"
 
-    region = Entity("region", fields=lambda: {"name": query(q.name)})
+    region = region_entity()
 
     sch = schema(
         fields=lambda: {
@@ -661,7 +699,7 @@ def test_query_filter_of_function_arg():
         if enabled:
             yield q.name == "AFRICA"
 
-    region = Entity("region", fields=lambda: {"name": query(q.name)})
+    region = region_entity()
 
     sch = schema(
         fields=lambda: {
@@ -682,7 +720,7 @@ def test_query_filter_of_function_arg():
 
 
 def test_query_filter_of_query():
-    region = Entity("region", fields=lambda: {"name": query(q.name)})
+    region = region_entity()
 
     sch = schema(
         fields=lambda: {
@@ -737,8 +775,8 @@ def test_query_filter_of_query():
     assert data == {"region": [{"name": "AFRICA"}]}
 
 
-def test_query_fragment():
-    sch = get_simple_schema()
+def test_query_fragment(simple_schema):
+    sch = simple_schema
     data = execute(
         sch,
         """
@@ -761,8 +799,8 @@ def test_query_fragment():
     }
 
 
-def test_query_inline_fragment():
-    sch = get_simple_schema()
+def test_query_inline_fragment(simple_schema):
+    sch = simple_schema
     data = execute(
         sch,
         """
@@ -790,8 +828,7 @@ def test_query_inline_fragment():
 
 
 def test_introspection_typename():
-    region = Entity("region", fields=lambda: {"name": query(q.name)})
-    sch = schema(fields=lambda: {"region": query(q.region, region)})
+    sch = region_schema()
     data = execute(
         sch,
         """
@@ -815,8 +852,7 @@ def test_introspection_typename():
 
 def test_introspection_graphiql():
     """ Test query which is performed by GraphiQL tool."""
-    region = Entity("region", fields=lambda: {"name": query(q.name)})
-    sch = schema(fields=lambda: {"region": query(q.region, region)})
+    sch = region_schema()
     res = execute(
         sch,
         """
@@ -1093,7 +1129,7 @@ def test_entity_id():
 
 
 def test_query_arg_simple():
-    region = Entity("region", fields=lambda: {"name": query(q.name)})
+    region = region_entity()
     sch = schema(
         fields=lambda: {
             "region": query(
@@ -1114,7 +1150,7 @@ def test_query_arg_simple():
 
 
 def test_query_arg_first():
-    region = Entity("region", fields=lambda: {"name": query(q.name)})
+    region = region_entity()
     # Define schema with `regionByName` field configured to query a region type
     # with specified filter which depends on an argument of the specified type.
     #
@@ -1147,16 +1183,44 @@ def test_query_arg_first():
     ).data == {"regionByName": None}
 
 
+def test_query_arg_aliased_siblings():
+    region = region_entity()
+    sch = schema(
+        fields=lambda: {
+            "regionByName": query(
+                q.region.filter(
+                    q.name == argument("region", scalar.String)
+                ).first(),
+                type=region,
+            )
+        }
+    )
+
+    # Aliased siblings which differ only in argument values must each see
+    # their own data: argument values do not appear in the printed query
+    # syntax, so they must not be conflated by the per-execution result
+    # cache.
+    data = execute(
+        sch,
+        """
+        query {
+            a: regionByName(region: "AFRICA") { name }
+            b: regionByName(region: "ASIA") { name }
+        }
+        """,
+    ).data
+    assert data == {"a": {"name": "AFRICA"}, "b": {"name": "ASIA"}}
+
+
 def test_err_query_extra_arg():
-    region = Entity("region", fields=lambda: {"name": query(q.name)})
-    sch = schema(fields=lambda: {"region": query(query=q.region, type=region)})
+    sch = region_schema()
     res = execute(sch, "query { region { name } }", variables={"count": "12"})
     assert res.invalid
     assert res.errors[0].message == 'Unexpected variables: "count"'
 
 
 def test_err_query_arg_type_mismatch():
-    region = Entity("region", fields=lambda: {"name": query(q.name)})
+    region = region_entity()
     count = argument("count", NonNull(scalar.Int))
     sch = schema(
         fields=lambda: {
@@ -1257,7 +1321,7 @@ def test_query_related_arg_first():
 
 
 def test_query_on_object():
-    region = Entity("region", fields=lambda: {"name": query(q.name)})
+    region = region_entity()
     region_api = Object(
         "region_api",
         fields=lambda: {
@@ -1342,8 +1406,8 @@ def test_query_arg_scalars():
         schema_for(scalar.JSON)
 
 
-def test_exec_err_unknown_field_error():
-    sch = get_simple_schema()
+def test_exec_err_unknown_field_error(simple_schema):
+    sch = simple_schema
     res = execute(
         sch,
         """
@@ -1356,7 +1420,7 @@ def test_exec_err_unknown_field_error():
 
 
 def test_exec_err_query_unknown_arg():
-    region = Entity(name="region", fields=lambda: {"name": query(q.name)})
+    region = region_entity()
     sch = schema(
         fields=lambda: {
             "region": query(
@@ -1708,7 +1772,7 @@ def test_query_connect_filters():
         if name is not None:
             yield q.name.matches(name)
 
-    region = Entity(name="region", fields=lambda: {"name": query(q.name)})
+    region = region_entity()
 
     sch = schema(
         fields=lambda: {"region": connect(region, filters=[filter_by_name])}
@@ -1795,7 +1859,7 @@ def test_err_query_param_invalid_type():
     num_nations = param(
         name="current_region", type=scalar.Int, f=lambda parent, ctx: "oops"
     )
-    region = Entity(name="region", fields=lambda: {"name": query(q.name)})
+    region = region_entity()
     sch = schema(
         fields=lambda: {
             "region": query(
@@ -1831,16 +1895,20 @@ def test_mutation_simple():
     assert counter == 10
 
 
+# Prepared once at module level: repeated calls reuse one query object
+# and, through htsql's plan cache, one compiled plan.
+_make_region_query = Query("/insert(region := {name := $name})")
+_find_region_query = Query("top(region?name=$name)")
+
+
 @mutation_from_function()
 def make_region(name: scalar.String) -> scalar.String:
-    db = get_db()
-    db.produce("/insert(region := {name := $name})", name=name)
+    _make_region_query.produce(name=name)
     return name
 
 
 def find_region(name):
-    db = get_db()
-    pr = db.produce("top(region?name=$name)", name=name)
+    pr = _find_region_query.produce(name=name)
     return pr.data
 
 
@@ -2251,7 +2319,7 @@ def test_arg_list():
 
 
 def test_scalar_type_id():
-    region = Entity("region", fields=lambda: {"name": query(q.name)})
+    region = region_entity()
     region_id = entity_id.region
     lineitem = Entity("lineitem", fields=lambda: {})
     lineitem_id = entity_id.lineitem
@@ -2326,7 +2394,7 @@ def test_scalar_type_id():
 
 
 def test_sort():
-    region = Entity("region", fields=lambda: {"name": query(q.name)})
+    region = region_entity()
     sch = schema(
         fields=lambda: {
             "region": query(q.region, sort=q.name.desc(), type=region)
@@ -2459,8 +2527,8 @@ def test_query_keep():
     }
 
 
-def test_directive_skip_field():
-    sch = get_simple_schema()
+def test_directive_skip_field(simple_schema):
+    sch = simple_schema
 
     data = execute(
         sch,
@@ -2491,8 +2559,8 @@ def test_directive_skip_field():
     assert data == {"africa": [{"name": "AFRICA"}]}
 
 
-def test_directive_skip_fragment():
-    sch = get_simple_schema()
+def test_directive_skip_fragment(simple_schema):
+    sch = simple_schema
 
     data = execute(
         sch,
@@ -2529,8 +2597,8 @@ def test_directive_skip_fragment():
     assert data == {"africa": [{"name": "AFRICA"}]}
 
 
-def test_directive_skip_inline_fragment():
-    sch = get_simple_schema()
+def test_directive_skip_inline_fragment(simple_schema):
+    sch = simple_schema
 
     data = execute(
         sch,
@@ -2565,8 +2633,8 @@ def test_directive_skip_inline_fragment():
     assert data == {"africa": [{"name": "AFRICA"}]}
 
 
-def test_directive_include_field():
-    sch = get_simple_schema()
+def test_directive_include_field(simple_schema):
+    sch = simple_schema
 
     data = execute(
         sch,
@@ -2597,8 +2665,8 @@ def test_directive_include_field():
     assert data == {"africa": [{"name": "AFRICA", "nation_count": 5}]}
 
 
-def test_directive_include_fragment():
-    sch = get_simple_schema()
+def test_directive_include_fragment(simple_schema):
+    sch = simple_schema
 
     data = execute(
         sch,
@@ -2635,8 +2703,8 @@ def test_directive_include_fragment():
     assert data == {"africa": [{"name": "AFRICA", "nation_count": 5}]}
 
 
-def test_directive_include_inline_fragment():
-    sch = get_simple_schema()
+def test_directive_include_inline_fragment(simple_schema):
+    sch = simple_schema
 
     data = execute(
         sch,
@@ -2671,61 +2739,25 @@ def test_directive_include_inline_fragment():
     assert data == {"africa": [{"name": "AFRICA", "nation_count": 5}]}
 
 
-def test_directive_skip_over_include():
-    sch = get_simple_schema()
-
-    data = execute(
-        sch,
-        """
-        query($include: Boolean!, $skip: Boolean!) {
-            africa {
-                name
-                nation_count @include(if: $include) @skip(if: $skip)
-            }
-        }
-        """,
-        variables={"include": True, "skip": True},
-    ).data
-    assert data == {"africa": [{"name": "AFRICA"}]}
-
-    data = execute(
-        sch,
-        """
-        query($include: Boolean!, $skip: Boolean!) {
-            africa {
-                name
-                nation_count @include(if: $include) @skip(if: $skip)
-            }
-        }
-        """,
-        variables={"include": False, "skip": True},
-    ).data
-    assert data == {"africa": [{"name": "AFRICA"}]}
-
-    data = execute(
-        sch,
-        """
-        query($include: Boolean!, $skip: Boolean!) {
-            africa {
-                name
-                nation_count @include(if: $include) @skip(if: $skip)
-            }
-        }
-        """,
-        variables={"include": True, "skip": False},
-    ).data
-    assert data == {"africa": [{"name": "AFRICA", "nation_count": 5}]}
+def test_directive_skip_over_include(simple_schema):
+    sch = simple_schema
 
-    data = execute(
-        sch,
-        """
+    # A single query source so all four combinations reuse the same parsed
+    # document and compiled plan; @skip wins over @include, so the field is
+    # present only for include=True, skip=False.
+    query_src = """
         query($include: Boolean!, $skip: Boolean!) {
             africa {
                 name
                 nation_count @include(if: $include) @skip(if: $skip)
             }
         }
-        """,
-        variables={"include": False, "skip": False},
-    ).data
-    assert data == {"africa": [{"name": "AFRICA"}]}
+    """
+    for include, skip in itertools.product([True, False], repeat=2):
+        data = execute(
+            sch, query_src, variables={"include": include, "skip": skip}
+        ).data
+        if include and not skip:
+            assert data == {"africa": [{"name": "AFRICA", "nation_count": 5}]}
+        else:
+            assert data == {"africa": [{"name": "AFRICA"}]}
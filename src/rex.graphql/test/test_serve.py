@@ -12,8 +12,9 @@ from rex.graphql import (
     q,
     Entity,
     scalar,
+    execute,
 )
-from rex.graphql.serve import serve
+from rex.graphql.serve import serve, _result_cache
 
 
 @pytest.fixture(scope="module")
@@ -285,6 +286,98 @@ def test_serve_exec_err_invalid_syntax(sch):
         assert res.json["errors"]
 
 
+def _json_req(query):
+    return Request.blank(
+        "/",
+        method="POST",
+        accept="application/json",
+        content_type="application/json",
+        body=json.dumps({"query": query}).encode("utf8"),
+    )
+
+
+def _counting_execute(calls):
+    def run(**kwargs):
+        calls.append(1)
+        return execute(**kwargs)
+
+    return run
+
+
+def test_serve_cache_results_hit(sch):
+    _result_cache.clear()
+    calls = []
+    counting_execute = _counting_execute(calls)
+
+    res = serve(sch, _json_req(query_all), cache_results=True, _execute=counting_execute)
+    assert res.json == expected_all
+    assert len(calls) == 1
+
+    # Second request is served from the cache without executing.
+    res = serve(sch, _json_req(query_all), cache_results=True, _execute=counting_execute)
+    assert res.json == expected_all
+    assert len(calls) == 1
+
+
+def test_serve_cache_results_no_cache_header(sch):
+    _result_cache.clear()
+    calls = []
+    counting_execute = _counting_execute(calls)
+
+    serve(sch, _json_req(query_all), cache_results=True, _execute=counting_execute)
+    assert len(calls) == 1
+
+    # Cache-Control: no-cache bypasses the cache.
+    req = _json_req(query_all)
+    req.headers["Cache-Control"] = "no-cache"
+    res = serve(sch, req, cache_results=True, _execute=counting_execute)
+    assert res.json == expected_all
+    assert len(calls) == 2
+
+
+def test_serve_cache_results_mutation_bypass(sch):
+    _result_cache.clear()
+    calls = []
+    counting_execute = _counting_execute(calls)
+    query = 'mutation { make_region(name: "X") }'
+
+    # The schema defines no mutations so execution fails, but the point
+    # stands either way: mutation texts reach the executor every time and
+    # never populate the cache.
+    for _ in range(2):
+        with pytest.raises(HTTPBadRequest):
+            serve(
+                sch,
+                _json_req(query),
+                cache_results=True,
+                _execute=counting_execute,
+            )
+
+    assert len(calls) == 2
+    assert len(_result_cache) == 0
+
+
+def test_serve_cache_results_context_bypass(sch):
+    _result_cache.clear()
+    calls = []
+    counting_execute = _counting_execute(calls)
+
+    for _ in range(2):
+        res = serve(
+            sch,
+            _json_req(query_all),
+            context={"user": "alice"},
+            cache_results=True,
+            _execute=counting_execute,
+        )
+        assert res.json == expected_all
+
+    # A per-request context makes the response identity-dependent, so it
+    # is recomputed every time and never cached.
+    assert len(calls) == 2
+    assert len(_result_cache) == 0
+
+
 def test_error_aborts_db_tx(rex, sch):
     query = """
     mutation { make_region_and_fail }